@@ -1,3 +1,4 @@
+import sys
 from unifi import UnifiPy
 from datetime import datetime, timedelta
 
@@ -13,12 +14,32 @@ start = datetime.now() - timedelta(days=7)
 end = datetime.now()
 epoch = datetime.utcfromtimestamp(0)
 
+# Bytes per gigabyte
+_BYTES_PER_GB = 1e9
+
 
 # Datetime to epoch milliseconds
 def unix_time_millis(dt):
     return int((dt - epoch).total_seconds() * 1000.0)
 
 
+def print_usage(usage, devices_by_mac):
+    dev_get = devices_by_mac.get
+    utcfromtimestamp = datetime.utcfromtimestamp
+    lines = []
+    for x in usage:
+        utc_time = utcfromtimestamp(x["time"] / 1000)
+        download = x["tx_bytes"] / _BYTES_PER_GB
+        upload = x["rx_bytes"] / _BYTES_PER_GB
+        ap = x.get("ap")
+
+        device = dev_get(ap)
+
+        lines.append(f"{utc_time} {ap} {device.name} {download} {upload}\n")
+
+    sys.stdout.write("".join(lines))
+
+
 def main():
     unifipy = UnifiPy(
         controller=CONTROLLER,
@@ -27,45 +48,22 @@ def main():
     )
 
     # Fetch all APs from the Unifi Controller, Site name is optional. If not provided, devices from all sites will be returned.
-    devices = unifipy.devices.get(site_name="aoewakfu")
-
-    devices_by_mac = {device.mac: device for device in devices}
-
-    daily_usage = unifipy.usage.get_daily_usage(
-        site="aoewakfu",
-        start=unix_time_millis(start),
-        end=unix_time_millis(end),
-        devices=list(devices_by_mac.keys()) # Usage is fetched from the Unifi Controller using mac addresses.
-    )
+    devices_by_mac = unifipy.devices.get_by_mac(site_name="aoewakfu")
 
-    for x in daily_usage:
-        utc_time = datetime(1970, 1, 1) + timedelta(milliseconds=x["time"])
-        download = x.get("tx_bytes")/1000000/1000
-        upload = x.get("rx_bytes")/1000000/1000
-        ap = x.get("ap")
+    # Usage is fetched from the Unifi Controller using mac addresses.
+    mac_list = list(devices_by_mac)
 
-        device = devices_by_mac.get(ap)
-        
-        print(utc_time, ap, device.name, download, upload)
-
-
-    hourly = unifipy.usage.get_hourly_usage(
+    usage = unifipy.usage.get_usage_batch(
         site="aoewakfu",
         start=unix_time_millis(start),
         end=unix_time_millis(end),
-        devices=list(devices_by_mac.keys()) # Usage is fetched from the Unifi Controller using mac addresses.
+        devices=mac_list
     )
+    daily_usage = usage["daily"]
+    hourly = usage["hourly"]
 
-    for x in hourly:
-        utc_time = datetime(1970, 1, 1) + timedelta(milliseconds=x["time"])
-        download = x.get("tx_bytes")/1000000/1000
-        upload = x.get("rx_bytes")/1000000/1000
-        ap = x.get("ap")
-        
-        device = devices_by_mac.get(ap)
-        
-        print(utc_time, ap, device.name, download, upload)
-
+    print_usage(daily_usage, devices_by_mac)
+    print_usage(hourly, devices_by_mac)
 
 
 if __name__ == "__main__":
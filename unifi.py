@@ -1,8 +1,11 @@
-from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
+import random
+import time
 from datetime import datetime
-from retrying import retry
 
 
 UNIFI_STATE_CODES = {
@@ -34,6 +37,9 @@ class UnifiFetchException(Exception):
     pass
 
 
+_RSSI_LUT = tuple(round((min(45, max(i, 5)) - 5) / 40 * 99, 2) for i in range(101))
+
+
 def rssi_to_connection_percent(rssi):
     """
     From Unifi Controller Source Code
@@ -47,6 +53,8 @@ def rssi_to_connection_percent(rssi):
         return ""
     }
     """
+    if isinstance(rssi, int):
+        return _RSSI_LUT[max(0, min(100, rssi))]
     return round((min(45, max(rssi, 5)) - 5) / 40 * 99, 2)
 
 
@@ -57,48 +65,51 @@ def is_device_online(device):
 
 
 class UnifiDevice:
+    __slots__ = (
+        "id", "mac", "ip", "model", "type", "version", "adopted", "site_id",
+        "inform_url", "name", "mesh_sta_vap_enabled", "state", "vwireEnabled",
+        "uplink_mac", "uplink_type", "uplink_speed", "uplink_rssi", "uplink_signal",
+        "uplink_noise", "uplink_rx_rate", "uplink_tx_rate", "uplink_table",
+        "uplink_1", "uplink_2", "scanning", "last_seen", "uptime",
+        "connect_request_ip", "gateway_mac"
+    )
+
     def __init__(self, device_dict):
-        self.id = device_dict.get("_id")
-        self.mac = device_dict.get("mac")
-        self.ip = device_dict.get("ip")
-        self.model = device_dict.get("model")
-        self.type = device_dict.get("type")
-        self.version = device_dict.get("version")
-        self.adopted = device_dict.get("adopted")
-        self.site_id = device_dict.get("site_id")
-        self.inform_url = device_dict.get("inform_url")
-        self.name = device_dict.get("name")
-        self.mesh_sta_vap_enabled = device_dict.get("mesh_sta_vap_enabled")
-        self.state = device_dict.get("state")
-        self.vwireEnabled = device_dict.get("vwireEnabled")
-        if device_dict.get("uplink"):
-            self.uplink_mac = device_dict.get("uplink").get("uplink_mac")
-            self.uplink_type = device_dict.get("uplink").get("type")
-            self.uplink_speed = device_dict.get("uplink").get("speed")
-            self.uplink_rssi = device_dict.get("uplink").get("rssi")
-            self.uplink_signal = device_dict.get("uplink").get("signal")
-            self.uplink_noise = device_dict.get("uplink").get("noise")
-            self.uplink_rx_rate = device_dict.get("uplink").get("rx_rate")
-            self.uplink_tx_rate = device_dict.get("uplink").get("tx_rate")
-        else:
-            self.uplink_mac = None
-            self.uplink_type = None
-            self.uplink_speed = None
-            self.uplink_rssi = None
-            self.uplink_signal = None
-            self.uplink_noise = None
-            self.uplink_rx_rate = None
-            self.uplink_tx_rate = None
-
-        self.uplink_table = device_dict.get("uplink_table") if device_dict.get("uplink_table") else None
-        self.uplink_1 = device_dict.get("mesh_uplink_1") if device_dict.get("mesh_uplink_1") else None
-        self.uplink_2 = device_dict.get("mesh_uplink_2") if device_dict.get("mesh_uplink_2") else None
-        self.scanning = device_dict.get("spectrum_scanning") if device_dict.get("spectrum_scanning") else False
-        self.last_seen = datetime.fromtimestamp(device_dict.get("last_seen")) if device_dict.get("last_seen") else None
-        self.uptime = device_dict.get("uptime")
-    
-        self.connect_request_ip = device_dict.get("connect_request_ip")
-        self.gateway_mac = device_dict.get("gateway_mac")if device_dict.get("gateway_mac") else None
+        g = device_dict.get
+        self.id = g("_id")
+        self.mac = g("mac")
+        self.ip = g("ip")
+        self.model = g("model")
+        self.type = g("type")
+        self.version = g("version")
+        self.adopted = g("adopted")
+        self.site_id = g("site_id")
+        self.inform_url = g("inform_url")
+        self.name = g("name")
+        self.mesh_sta_vap_enabled = g("mesh_sta_vap_enabled")
+        self.state = g("state")
+        self.vwireEnabled = g("vwireEnabled")
+
+        uplink = g("uplink") or {}
+        self.uplink_mac = uplink.get("uplink_mac")
+        self.uplink_type = uplink.get("type")
+        self.uplink_speed = uplink.get("speed")
+        self.uplink_rssi = uplink.get("rssi")
+        self.uplink_signal = uplink.get("signal")
+        self.uplink_noise = uplink.get("noise")
+        self.uplink_rx_rate = uplink.get("rx_rate")
+        self.uplink_tx_rate = uplink.get("tx_rate")
+
+        self.uplink_table = g("uplink_table") or None
+        self.uplink_1 = g("mesh_uplink_1") or None
+        self.uplink_2 = g("mesh_uplink_2") or None
+        self.scanning = g("spectrum_scanning") or False
+        last_seen = g("last_seen")
+        self.last_seen = datetime.fromtimestamp(last_seen) if last_seen else None
+        self.uptime = g("uptime")
+
+        self.connect_request_ip = g("connect_request_ip")
+        self.gateway_mac = g("gateway_mac") or None
 
     def is_online(self):
         if self.state == 1:
@@ -107,10 +118,13 @@ class UnifiDevice:
 
 
 class UnifiSite:
+    __slots__ = ("id", "name", "desc")
+
     def __init__(self, device_dict):
-        self.id = device_dict.get("_id")
-        self.name = device_dict.get("name")
-        self.desc = device_dict.get("desc")
+        g = device_dict.get
+        self.id = g("_id")
+        self.name = g("name")
+        self.desc = g("desc")
 
 
 class UnifiSiteApi:
@@ -129,18 +143,41 @@ class UnifiUsageApi:
 
     def __init__(self, unifipy):
         self.unifipy = unifipy
-    
-    def get_hourly_usage(self, site, start, end, devices):
-        url = self.ENDPOINT % (site, "hourly")
+
+    @staticmethod
+    def _usage_body(start, end, devices):
         data = {"attrs": ["tx_bytes", "rx_bytes", "time"], "end": end, "start": start, "macs": devices}
-        usage = self.unifipy.post(url, data=data)["data"]
+        return orjson.dumps(data)
+
+    def _post_usage(self, site, interval, body):
+        url = self.ENDPOINT % (site, interval)
+        usage = self.unifipy.post_raw(url, body)["data"]
         return usage
 
+    def get_usage(self, site, interval, start, end, devices):
+        return self._post_usage(site, interval, self._usage_body(start, end, devices))
+
+    def get_hourly_usage(self, site, start, end, devices):
+        return self.get_usage(site, "hourly", start, end, devices)
+
     def get_daily_usage(self, site, start, end, devices):
-        url = self.ENDPOINT % (site, "daily")
-        data = {"attrs": ["tx_bytes", "rx_bytes", "time"], "end": end, "start": start, "macs": devices}
-        usage = self.unifipy.post(url, data=data)["data"]
-        return usage
+        return self.get_usage(site, "daily", start, end, devices)
+
+    def get_usage_batch(self, site, start, end, devices, intervals=("daily", "hourly")):
+        """
+            Fetches usage for several report intervals concurrently over the shared session.
+            :return: dict of interval name to usage list, e.g. {"daily": [...], "hourly": [...]}
+
+        """
+        if not intervals:
+            return {}
+        body = self._usage_body(start, end, devices)
+        with ThreadPoolExecutor(max_workers=len(intervals)) as executor:
+            futures = {
+                interval: executor.submit(self._post_usage, site, interval, body)
+                for interval in intervals
+            }
+        return {interval: future.result() for interval, future in futures.items()}
 
 
 class UnifiDeviceApi:
@@ -152,7 +189,10 @@ class UnifiDeviceApi:
     def __init__(self, unifipy):
         self.unifipy = unifipy
 
-    @retry(stop_max_attempt_number=3, wait_random_min=1000, wait_random_max=2000)
+    def _iter_devices(self, site_name):
+        for device in self.unifipy.get(self.ENDPOINT % site_name)["data"]:
+            yield UnifiDevice(device)
+
     def get(self, site_name=None):
         """
             Fetches devices from the Unifi controller.     
@@ -161,17 +201,25 @@ class UnifiDeviceApi:
         """
         devices = []
         if site_name:
-            devices += self.unifipy.get(self.ENDPOINT % site_name)["data"]
-            return[UnifiDevice(device) for device in devices]
+            return list(self._iter_devices(site_name))
         else:
             sites = self.unifipy.sites.get()
             site_names = [site.name for site in sites]
-            pool = Pool(8)
-            device_lists = pool.map(self.get, site_names)
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                device_lists = list(executor.map(self.get, site_names))
             for x in device_lists:
                 devices += x
         return devices
 
+    def get_by_mac(self, site_name=None):
+        """
+            Fetches devices from the Unifi controller keyed by mac address.
+            :param site_name: optional, if defined only devices from this site will be returned
+
+        """
+        devices = self._iter_devices(site_name) if site_name else self.get()
+        return {device.mac: device for device in devices}
+
 
     def restart(self, mac, site_name):
         data = {
@@ -275,6 +323,20 @@ class UnifiPy:
         self.password = password
         self.controller = controller
         self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=64,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["GET", "PUT"],
+                raise_on_status=False
+            )
+        )
+        self.session.mount("https://", adapter)
+        self.session.headers["Connection"] = "keep-alive"
+        self.session.hooks["response"].append(self._refresh_csrf)
         self.login()
 
         self.sites = UnifiSiteApi(self)
@@ -286,58 +348,77 @@ class UnifiPy:
         r = self.session.get(self.controller + endpoint, timeout=10)
         if r.status_code != 200:
             raise UnifiGetException
-        try:
-            j = r.json()
-        except json.decoder.JSONDecodeError:
-            raise UnifiFetchException
-        return j
+        return self._decode(r)
 
 
     def post(self, endpoint, data):
-        r = self.session.post(
-            self.controller + endpoint,
-            json=data, 
-            timeout=10
-        )
-        if r.status_code != 200:
-            raise UnifiPostException
-        try:
-            j = r.json()
-        except json.decoder.JSONDecodeError:
-            raise UnifiFetchException
-        return j
+        r = self._json_request("POST", endpoint, data=data)
+        return self._decode(r)
+
+
+    def post_raw(self, endpoint, body):
+        r = self._json_request("POST", endpoint, body=body)
+        return self._decode(r)
 
 
     def post_no_json_response(self, endpoint, data):
-        r = self.session.post(
-            self.controller + endpoint, 
-            json=data, 
-            timeout=10
-        )
-        if r.status_code != 200:
-            raise UnifiPostException
+        self._json_request("POST", endpoint, data=data)
 
 
     def put(self, endpoint, data):
-        r = self.session.put(self.controller + endpoint, json=data, timeout=10)
+        r = self._json_request("PUT", endpoint, data=data)
+        return self._decode(r)
+
+
+    def _json_request(self, method, endpoint, data=None, body=None):
+        # Arbitrary payloads go through requests' json= encoder, which accepts anything the stdlib does.
+        # body is for pre-encoded JSON bytes we build ourselves, e.g. the usage report request.
+        if body is not None:
+            kwargs = {"data": body, "headers": {"Content-Type": "application/json"}}
+        else:
+            kwargs = {"json": data}
+        r = self.session.request(
+            method,
+            self.controller + endpoint,
+            timeout=10,
+            **kwargs
+        )
         if r.status_code != 200:
             raise UnifiPostException
+        return r
+
+
+    @staticmethod
+    def _decode(r):
         try:
-            j = r.json()
-        except json.decoder.JSONDecodeError:
+            j = orjson.loads(r.content)
+        except orjson.JSONDecodeError:
             raise UnifiFetchException
         return j
 
 
-    @retry(stop_max_attempt_number=3, wait_random_min=1000, wait_random_max=2000)
-    def login(self):
+    def login(self, attempts=3):
+        # POSTs are not retried by the adapter, controller commands must not be replayed.
+        # Logging in is safe to repeat, so it gets its own retry loop.
         data = {
-            "username": "%s" % self.username,
-            "password": "%s" % self.password,
+            "username": self.username,
+            "password": self.password,
             "strict": True
         }
-        r = self.post(self.ENDPOINT_LOGIN, data)
-        self.session.headers["X-Csrf-Token"] = self.session.cookies["csrf_token"]
+        for attempt in range(attempts):
+            try:
+                return self.post(self.ENDPOINT_LOGIN, data)
+            except (requests.RequestException, UnifiPostException, UnifiFetchException):
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(random.uniform(1, 2))
+
+
+    def _refresh_csrf(self, r, *args, **kwargs):
+        # The controller may rotate the CSRF token mid-session, keep the header in step with the cookie.
+        csrf_token = r.cookies.get("csrf_token")
+        if csrf_token:
+            self.session.headers["X-Csrf-Token"] = csrf_token
 
 
     def get_devices(self, site_code):